@@ -1,109 +1,78 @@
 import streamlit as st
 import pandas as pd
-import random
-from itertools import combinations
 import numpy as np
-from collections import Counter
+from collections import namedtuple
+from functools import lru_cache
+
+from grouping_kernels import search_grouping
+
+NUM_TRIALS = 100 # 1日あたりの試行回数
+
+# 参加者一覧（参加者ごとの配列を並べた形で持つ）
+# ids: 受講者ナンバー, companies: 会社番号（A=0, B=1, ...）, letters: 会社番号に対応する会社名
+Participants = namedtuple('Participants', ['ids', 'companies', 'letters'])
 
 # --- Helper Functions (Backend Logic) ---
 
 def generate_participant_list(company_participants):
-    """会社ごとの参加者数から参加者リストを生成する"""
-    participants = []
-    participant_id = 1
-    company_letter = 'A'
-    for num in company_participants:
-        for _ in range(num):
-            participants.append({'id': participant_id, 'company': company_letter})
-            participant_id += 1
-        company_letter = chr(ord(company_letter) + 1)
-    return participants
-
-def analyze_company_duplicates(group):
+    """会社ごとの参加者数から参加者一覧を生成する"""
+    companies = np.repeat(np.arange(len(company_participants), dtype=np.int16), company_participants)
+    # 受講者ナンバーは配列のインデックス + 1
+    ids = np.arange(1, len(companies) + 1, dtype=np.int32)
+    letters = [chr(ord('A') + i) for i in range(len(company_participants))]
+    return Participants(ids=ids, companies=companies, letters=letters)
+
+def analyze_company_duplicates(group_company_ids, letters):
     """グループ内の企業重複を分析し、文字列として返す"""
-    if not group:
-        return "なし"
+    company_counts = np.bincount(group_company_ids, minlength=len(letters))
+    duplicates = np.flatnonzero(company_counts > 1)
     
-    company_counts = Counter(p['company'] for p in group)
-    duplicates = {company: count for company, count in company_counts.items() if count > 1}
-    
-    if not duplicates:
+    if duplicates.size == 0:
         return "なし"
     
     # 文字列にフォーマット: "会社A: 2名, 会社B: 2名"
-    return ", ".join([f"会社{company}: {count}名" for company, count in sorted(duplicates.items())])
+    return ", ".join([f"会社{letters[c]}: {company_counts[c]}名" for c in duplicates])
 
-def create_day_grouping(participants, num_groups, existing_pairs):
+def create_day_grouping(company_ids, num_groups, co_matrix, seed_sequence):
     """
     1日分のグループ分けを作成する。重複を許容しつつ、最適な配置を探す。
+    試行ごとの乱数シードは seed_sequence から生成する。
+    戻り値は各グループに属する参加者インデックスの配列のリスト。
     """
-    if not participants:
+    total_participants = len(company_ids)
+    if total_participants == 0:
         return []
     
-    total_participants = len(participants)
     group_size = total_participants // num_groups
     # 人数が割り切れない場合のあまり
     remainder = total_participants % num_groups
 
     # 各グループの目標人数を計算
-    group_capacities = [group_size + 1 if i < remainder else group_size for i in range(num_groups)]
+    group_capacities = np.array([group_size + 1 if i < remainder else group_size for i in range(num_groups)], dtype=np.int32)
 
-    # 複数回試行してベストなものを探す
-    best_grouping = None
-    min_overall_score = float('inf')
+    # 複数回試行してベストなものを探す（試行ごとのシードは事前に生成）
+    seeds = seed_sequence.generate_state(NUM_TRIALS)
+    best_members, _ = search_grouping(company_ids, group_capacities, co_matrix, num_groups, NUM_TRIALS, seeds)
 
-    for _ in range(100): # 試行回数
-        current_grouping = [[] for _ in range(num_groups)]
-        temp_participants = random.sample(participants, len(participants))
-        
-        assignment_successful = True
-        for p in temp_participants:
-            available_groups_indices = [i for i, g in enumerate(current_grouping) if len(g) < group_capacities[i]]
-            
-            if not available_groups_indices:
-                assignment_successful = False
-                break
-            
-            # 各グループへの割り当てスコアを計算
-            group_scores = []
-            for i in available_groups_indices:
-                group = current_grouping[i]
-                # 企業の重複には高いペナルティを課す
-                company_penalty = 100 * sum(1 for m in group if m['company'] == p['company'])
-                # 過去の同席回数もスコアに加える
-                co_occurrence_score = sum(existing_pairs.get(tuple(sorted((p['id'], m['id']))), 0) for m in group)
-                total_score = company_penalty + co_occurrence_score
-                group_scores.append((total_score, i))
-            
-            # 最もスコアの低い（=最も良い）グループに割り当て
-            best_group_index = min(group_scores, key=lambda x: x[0])[1]
-            current_grouping[best_group_index].append(p)
-        
-        if assignment_successful:
-             # この日のグループ分けの総合スコアを計算（企業重複と個人重複の合計）
-            current_overall_score = 0
-            for group in current_grouping:
-                # 企業重複のスコア
-                company_counts = Counter(p['company'] for p in group)
-                current_overall_score += sum(count - 1 for count in company_counts.values() if count > 1) * 100
-                # 個人重複のスコア
-                for p1, p2 in combinations(group, 2):
-                    pair = tuple(sorted((p1['id'], p2['id'])))
-                    current_overall_score += existing_pairs.get(pair, 0)
-            
-            if current_overall_score < min_overall_score:
-                min_overall_score = current_overall_score
-                best_grouping = current_grouping
+    # 表示用に各グループのメンバーを受講者ナンバー順に並べる
+    return [np.sort(best_members[g, :group_capacities[g]]) for g in range(num_groups)]
 
-    return best_grouping
+@lru_cache(maxsize=None)
+def pair_indices(group_size):
+    """グループ人数ごとに、グループ内の全ペアの位置 (i, j), i < j を返す（人数ごとに1回だけ計算）"""
+    return np.triu_indices(group_size, 1)
 
-def generate_all_days(participants, num_days, num_groups):
-    """複数日分のグループ分けプラン全体を生成する"""
+def generate_all_days(participants, num_days, num_groups, seed):
+    """複数日分のグループ分けプラン全体を生成する（同じ条件とシードなら同じ結果になる）"""
     all_day_groups = []
-    co_occurrence = {}
+    # co_matrix[i, j] は参加者 i と j が同じグループになった回数（対称行列）
+    size = len(participants.ids)
+    co_matrix = np.zeros((size, size), dtype=np.int32)
+    # 日ごとに独立した乱数系列を使う
+    day_seed_sequences = np.random.SeedSequence(seed).spawn(num_days)
 
     for day in range(num_days):
-        day_grouping = create_day_grouping(participants, num_groups, co_occurrence)
+        day_grouping = create_day_grouping(participants.companies, num_groups, co_matrix, day_seed_sequences[day])
         
         if not day_grouping:
             st.error(f"**{day+1}日目**のグループ分けに失敗しました。条件が複雑すぎる可能性があります。")
@@ -111,21 +80,31 @@ def generate_all_days(participants, num_days, num_groups):
 
         all_day_groups.append(day_grouping)
         
+        # その日の全グループのペアをまとめて、同席回数を一度に更新する
+        pairs_i, pairs_j = [], []
         for group in day_grouping:
-            for p1, p2 in combinations(group, 2):
-                pair = tuple(sorted((p1['id'], p2['id'])))
-                co_occurrence[pair] = co_occurrence.get(pair, 0) + 1
+            i, j = pair_indices(len(group))
+            pairs_i.append(group[i])
+            pairs_j.append(group[j])
+        pairs_i = np.concatenate(pairs_i)
+        pairs_j = np.concatenate(pairs_j)
+        # 1日のグループは互いに重ならないので同じペアは2回現れない（np.add.at で重複を集計する必要がない）
+        co_matrix[pairs_i, pairs_j] += 1
+        co_matrix[pairs_j, pairs_i] += 1
     
-    return all_day_groups, co_occurrence
+    return all_day_groups, co_matrix
+
+@st.cache_data(show_spinner=False)
+def compute_plan(company_participants, num_days, num_groups, seed):
+    """入力条件からグループ分けプランを作成する（同じ条件での再実行時はキャッシュを返す）"""
+    participants = generate_participant_list(company_participants)
+    all_day_groups, co_matrix = generate_all_days(participants, num_days, num_groups, seed)
+    return participants, all_day_groups, co_matrix
 
 def style_matrix(df):
-    """マトリクスのスタイルを設定する関数"""
-    def highlight_cells(val):
-        if val >= 2:
-            return 'background-color: #FFE6E6'  # 淡い赤色
-        return ''
-    
-    return df.style.applymap(highlight_cells)
+    """マトリクスのスタイルを設定する関数（2回以上同席したセルを色付けする）"""
+    # セルごとに関数を呼ばず、マトリクス全体を一度に比較してスタイルを決める
+    return df.style.apply(lambda d: np.where(d.values >= 2, 'background-color: #FFE6E6', ''), axis=None)  # 淡い赤色
 
 # --- Streamlit App (Frontend) ---
 st.set_page_config(layout="wide")
@@ -149,6 +128,7 @@ with st.sidebar:
     
     num_days = st.number_input('研修の日数', min_value=1, value=3, step=1)
     num_groups = st.number_input('1日あたりのグループ数', min_value=1, value=5, step=1)
+    seed = st.number_input('乱数シード', min_value=0, value=0, step=1, help='同じ条件と乱数シードからは同じグループ分けが作成されます。別の案を見たい場合は値を変更してください。')
 
     st.info(f"**合計参加人数:** {total_participants}名")
     
@@ -160,8 +140,7 @@ with st.sidebar:
         st.warning('合計参加人数がグループ数で割り切れないため、グループごとの人数が均等になりません。')
 
 if st.sidebar.button('グループ分けを作成する'):
-    participants = generate_participant_list(company_participants)
-    all_day_groups, co_occurrence = generate_all_days(participants, num_days, num_groups)
+    participants, all_day_groups, co_matrix = compute_plan(tuple(company_participants), num_days, num_groups, seed)
 
     if all_day_groups:
         st.header('✅ グループ分けの結果')
@@ -175,8 +154,8 @@ if st.sidebar.button('グループ分けを作成する'):
                 if len(group) > max_group_size:
                     max_group_size = len(group)
                 
-                group_members = [f"{p['id']}({p['company']})" for p in sorted(group, key=lambda x: x['id'])]
-                duplicate_info = analyze_company_duplicates(group)
+                group_members = [f"{participants.ids[p]}({participants.letters[participants.companies[p]]})" for p in group]
+                duplicate_info = analyze_company_duplicates(participants.companies[group], participants.letters)
                 display_data.append([f"グループ{g_idx+1}"] + group_members + [duplicate_info])
             
             # パディングしてDFの形状を統一
@@ -191,14 +170,7 @@ if st.sidebar.button('グループ分けを作成する'):
         st.header('🤝 参加者の重複回数（マトリクス）')
         st.info('縦軸と横軸の参加者番号が交差する数字が、研修全体で同じグループになった回数です。2以上の場合は色付きで表示されます。')
         
-        size = len(participants)
-        matrix = np.zeros((size, size), dtype=int)
-        for pair, count in co_occurrence.items():
-            p1_idx, p2_idx = pair[0] - 1, pair[1] - 1
-            matrix[p1_idx, p2_idx] = count
-            matrix[p2_idx, p1_idx] = count
-        
-        df_matrix = pd.DataFrame(matrix, index=range(1, size + 1), columns=range(1, size + 1))
+        df_matrix = pd.DataFrame(co_matrix, index=participants.ids, columns=participants.ids)
         
         # ■修正2: マトリクスに色付け機能を追加
         styled_matrix = style_matrix(df_matrix)
@@ -207,8 +179,8 @@ if st.sidebar.button('グループ分けを作成する'):
         # ■追加1: 参加者リストの表示（最下部に移動）
         st.header('👥 参加者リスト')
         participant_data = []
-        for p in participants:
-            participant_data.append([p['id'], p['company']])
+        for p_id, company in zip(participants.ids, participants.companies):
+            participant_data.append([p_id, participants.letters[company]])
         
         df_participants = pd.DataFrame(participant_data, columns=['受講者ナンバー', '会社'])
         st.table(df_participants.set_index('受講者ナンバー'))
@@ -0,0 +1,76 @@
+import numpy as np
+from numba import njit, prange
+
+# --- Numba Kernels (Backend Logic) ---
+
+# 型シグネチャを明示してインポート時にコンパイルし、結果をディスクにキャッシュする。
+# Streamlit は再実行のたびにモジュールを読み込み直さないため、コンパイルはプロセスごとに1回だけで済む。
+@njit('Tuple((int32[:, :], int64))(int16[:], int32[:], int32[:, :], int64, int64, uint32[:])', cache=True, parallel=True)
+def search_grouping(company_ids, capacities, co_matrix, num_groups, num_trials, seeds):
+    """
+    貪欲法によるグループ割り当てを num_trials 回試行し、最もスコアの低い割り当てとそのスコアを返す。
+    割り当ては members[g, :capacities[g]] がグループ g のメンバーとなる固定長の配列（余りは -1）。
+    試行 t では seeds[t] で乱数を初期化して参加者の並び順を決める。
+    各試行は独立しているため、スレッドで並列に実行する。
+    スコア0（企業重複も個人重複もない）の試行が見つかったら、それより後の試行は省略する。
+    """
+    total_participants = company_ids.shape[0]
+    num_companies = company_ids.max() + 1
+    max_group_size = capacities.max()
+
+    # 試行ごとの結果（各スレッドは自分の試行の行にだけ書き込む）
+    overall_scores = np.empty(num_trials, dtype=np.int64)
+    group_members_by_trial = np.full((num_trials, num_groups, max_group_size), -1, dtype=np.int32)
+    # スコア0になった試行のうち、見つかった中で最も若い番号（スレッド間で共有）
+    # 最も若いスコア0の試行は必ず実行されるので、省略する試行があっても結果はシードだけで決まる
+    first_zero_trial = np.full(1, num_trials, dtype=np.int64)
+
+    for t in prange(num_trials):
+        if first_zero_trial[0] < t:
+            overall_scores[t] = np.iinfo(np.int64).max
+            continue
+        np.random.seed(seeds[t])
+        order = np.random.permutation(total_participants)
+        group_sizes = np.zeros(num_groups, dtype=np.int32)
+        group_company_counts = np.zeros((num_groups, num_companies), dtype=np.int32)
+        # group_members[g, :group_sizes[g]] はグループ g の現メンバー（この試行の結果欄に直接書き込む）
+        group_members = group_members_by_trial[t]
+        # この日のグループ分けの総合スコア（企業重複と個人重複の合計）を割り当てながら積み上げる
+        current_overall_score = np.int64(0)
+
+        for pos in range(total_participants):
+            p = order[pos]
+            c = company_ids[p]
+
+            # 空きのあるグループのうち、最もスコアの低い（=最も良い）グループに割り当て
+            # 企業の重複には高いペナルティを課し、過去の同席回数をメンバーごとに加える
+            # （同席回数は非負なので、それまでの最良スコアに達した時点でそのグループの集計を打ち切る）
+            best_group_index = -1
+            best_group_score = np.int64(0)
+            for g in range(num_groups):
+                if group_sizes[g] >= capacities[g]:
+                    continue
+                score = np.int64(100 * group_company_counts[g, c])
+                for k in range(group_sizes[g]):
+                    if best_group_index >= 0 and score >= best_group_score:
+                        break
+                    score += co_matrix[p, group_members[g, k]]
+                if best_group_index < 0 or score < best_group_score:
+                    best_group_index = g
+                    best_group_score = score
+            # 企業重複は同じ会社の2人目以降を1人につき100として数えるため、
+            # 割り当て時の企業ペナルティ（100 × 既にいる同じ会社の人数）を置き換えて加える
+            same_company_count = group_company_counts[best_group_index, c]
+            current_overall_score += best_group_score - 100 * same_company_count
+            if same_company_count > 0:
+                current_overall_score += 100
+            group_members[best_group_index, group_sizes[best_group_index]] = p
+            group_sizes[best_group_index] += 1
+            group_company_counts[best_group_index, c] += 1
+
+        overall_scores[t] = current_overall_score
+        if current_overall_score == 0 and t < first_zero_trial[0]:
+            first_zero_trial[0] = t
+
+    best_trial = np.argmin(overall_scores)
+    return group_members_by_trial[best_trial].copy(), overall_scores[best_trial]